@@ -36,7 +36,7 @@ class D8(object):
     def __init__(self):
         """Constructor.
 
-        Defines inflows list which defines the flow direction for each
+        Defines inflows mask which defines the flow direction for each
         cell of the DEM. The kinematic approach is used the inflows are defines
         only once in this constructor.
         """
@@ -44,7 +44,7 @@ class D8(object):
         self.inflows = D8_.new_inflows(Globals.get_mat_fd())
 
     def update_inflows(self, fd):
-        """Update inflows list if the diffuse approach is used.
+        """Update inflows mask if the diffuse approach is used.
 
         In the diffusive approach the flow direction may change due to changes
         of the water level.
@@ -56,9 +56,9 @@ class D8(object):
     def cell_runoff(self, i, j):
         """Return the water volume water flows into cell i, j
 
-        Returns values from the previous time step based on the inflows list.
+        Returns values from the previous time step based on the inflows mask.
 
-        Inflows list definition is shown in the method  new_inflows() in the
+        Inflows mask definition is shown in the method  new_inflows() in the
         package smoderp2d.flow_algorithm.D8.
 
         The total inflow is sum of sheet and rill runoff volume.
@@ -68,19 +68,11 @@ class D8(object):
         :returns: inflow volume from the adjacent cells
         """
         inflow_from_cells = 0.0
-        for z in range(len(self.inflows[i][j])):
-            ax = self.inflows[i][j][z][0]
-            bx = self.inflows[i][j][z][1]
+        for ax, bx in D8_.OFFSETS[self.inflows[:, i, j]].tolist():
             iax = i + ax
             jbx = j + bx
-            if iax >= 0 and jbx >= 0:
-                insurfflow_from_cell = self.arr.vol_runoff.data[iax][jbx]
-            else:
-                insurfflow_from_cell = 0.0
-            if iax >= 0 and jbx >= 0:
-                inrillflow_from_cell = self.arr.vol_runoff_rill.data[iax][jbx]
-            else:
-                inrillflow_from_cell = 0.0
+            insurfflow_from_cell = self.arr.vol_runoff.data[iax][jbx]
+            inrillflow_from_cell = self.arr.vol_runoff_rill.data[iax][jbx]
             inflow_from_cells = inflow_from_cells + \
                 insurfflow_from_cell + inrillflow_from_cell
 
@@ -104,9 +96,10 @@ class Mfda(object):
     def __init__(self):
         """Constructor.
 
-        Defines inflows list which defines the flow direction for each
-        cell of the DEM. The kinematic approach is used the inflows are defines
-        only once in this constructor.
+        Defines inflows array of the sheet flow (mfda flow fractions) and
+        inflows mask of the rill flow (D8) which define the flow direction
+        for each cell of the DEM. The kinematic approach is used the inflows
+        are defines only once in this constructor.
         TODO.
         """
         Logger.info("Multiflow direction algorithm")
@@ -116,7 +109,7 @@ class Mfda(object):
         self.inflowsRill = D8_.new_inflows(fd_rill)
 
     def update_inflows(self, fd):
-        """Update inflows list if the diffuse approach is used.
+        """Update inflows array and mask if the diffuse approach is used.
 
         In the diffusive approach the flow direction may change due to changes
         of the water level.
@@ -129,9 +122,10 @@ class Mfda(object):
     def cell_runoff(self, i, j, sur=True):
         """Return the water volume water flows into cell i, j
 
-        Returns values from the previous time step based on the inflows list.
+        Returns values from the previous time step based on the inflows array
+        of the sheet flow and the inflows mask of the rill flow.
 
-        Inflows list definition is shown in the method  new_inflows() in the
+        Inflows mask definition is shown in the method  new_inflows() in the
         package smoderp2d.flow_algorithm.D8.
 
         The total inflow is sum of sheet and rill runoff volume.
@@ -209,9 +203,7 @@ class Mfda(object):
 
         if Globals.isRill and sur:
             state_ij = self.arr.state[i, j]
-            for z in range(len(self.inflowsRill[i][j])):
-                ax = self.inflowsRill[i][j][z][0]
-                bx = self.inflowsRill[i][j][z][1]
+            for ax, bx in D8_.OFFSETS[self.inflowsRill[:, i, j]].tolist():
                 iax = i + ax
                 jbx = j + bx
 
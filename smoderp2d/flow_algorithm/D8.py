@@ -1,116 +1,247 @@
+from collections import deque
+
 import numpy as np
 import numpy.ma as ma
 
-from smoderp2d.core.general import GridGlobals
+try:
+    from numba import njit, prange
+except ImportError:
+    # numba is optional, NumPy implementation is used instead
+    njit = None
+
+# relative position (i+m, j+n) of the neighbouring cells and flow direction
+# code the neighbour has when it drains into the cell i, j
+coco = [[-1, 1, 8], [-1, 0, 4], [-1, -1, 2], [0, -1, 1],
+        [1, -1, 128], [1, 0, 64], [1, 1, 32], [0, 1, 16]]
+
+# relative position (m, n) of the neighbouring cells in the order of the
+# inflows mask axis 0 and flow direction code the neighbour has when it
+# drains into the cell i, j
+OFFSETS = np.array([[1, -1], [1, 0], [1, 1], [0, 1],
+                    [-1, 1], [-1, 0], [-1, -1], [0, -1]], dtype=np.int8)
+DIRECTIONS = np.array([128, 64, 32, 16, 8, 4, 2, 1])
+
+# relative position (m, n) of the downstream cell indexed by the flow
+# direction code
+DOWNSTREAM_LUT = np.zeros([256, 2], np.intp)
+HAS_DOWNSTREAM = np.zeros(256, bool)
+DOWNSTREAM_LUT[DIRECTIONS] = -OFFSETS
+HAS_DOWNSTREAM[DIRECTIONS] = True
+
+# the same in the order of the coco list
+COCO_OFFSETS = np.array([k[:2] for k in coco], dtype=np.int8)
+COCO_DIRECTIONS = np.array([k[2] for k in coco])
+
+
+def _compute_inflows_numpy(mat_fd, coco_d, coco_c):
+    """Compute inflows mask of the flow direction raster.
+
+    The raster is padded by zero (no flow direction) so that the cells
+    outside of the raster never drain into the border.
+
+    :param mat_fd: flow direction raster (np ndarray)
+    :param coco_d: (n, 2) array of relative neighbour positions
+    :param coco_c: (n, ) array of draining flow direction codes
+    :return: np ndarray of bools of shape (n, r, c)
+    """
+    r, c = mat_fd.shape
+    padded = np.pad(mat_fd, 1, constant_values=0)
+    inflow_mask = np.zeros([coco_c.shape[0], r, c], bool)
+
+    for k, (a, b) in enumerate(coco_d.tolist()):
+        neigh = padded[1 + a:1 + a + r, 1 + b:1 + b + c]
+        inflow_mask[k] = neigh == coco_c[k]
+
+    return inflow_mask
+
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _compute_inflows_numba(mat_fd, coco_d, coco_c):
+        """Compute inflows mask of the flow direction raster.
+
+        Rows are independent of each other and are processed in parallel.
+
+        :param mat_fd: flow direction raster (np ndarray)
+        :param coco_d: (n, 2) array of relative neighbour positions
+        :param coco_c: (n, ) array of draining flow direction codes
+        :return: np ndarray of bools of shape (n, r, c)
+        """
+        r, c = mat_fd.shape
+        n = coco_c.shape[0]
+        inflow_mask = np.zeros((n, r, c), np.bool_)
+
+        for i in prange(r):
+            for j in range(c):
+                for k in range(n):
+                    a = i + coco_d[k, 0]
+                    b = j + coco_d[k, 1]
+                    if 0 <= a < r and 0 <= b < c and \
+                       mat_fd[a, b] == coco_c[k]:
+                        inflow_mask[k, i, j] = True
+
+        return inflow_mask
+
+    _compute_inflows = _compute_inflows_numba
+else:
+    _compute_inflows_numba = None
+    _compute_inflows = _compute_inflows_numpy
 
 
 # defines inflows to the cell of raster based on the flow direction raster
 #
-#  @infloes return list defines relative postion of cells \f$ i+m \f$ and
-#  \f$ j+n \f$ from which the water flows to cell \f$ i,j \f$. \n
+#  @inflows return boolean array of shape (8, r, c) which defines for each
+#  cell \f$ i,j \f$ from which of the neighbouring cells \f$ i+m \f$ and
+#  \f$ j+n \f$ the water flows into the cell. Relative position of the
+#  k-th neighbour is stored in OFFSETS[k].\n
 #
-#  Accordinto the figure, the inflows list at the cell \f$ i,j \f$ looks as
-#  follows:\n
+#  According to the figure, the inflow from the cell above the cell
+#  \f$ i,j \f$ looks as follows:\n
 #
-#  \f$ m_1 = inflows[i][j][0][0] = -1  \f$ \n
-#  \f$ n_1 = inflows[i][j][0][1] =  0  \f$ \n
-#  \f$ m_2 = inflows[i][j][1][0] =  -1 \f$ \n
-#  \f$ n_2 = inflows[i][j][1][1] =  +1 \f$ \n
+#  \f$ inflows[5][i][j] = True \f$ \n
+#  \f$ m = OFFSETS[5][0] = -1  \f$ \n
+#  \f$ n = OFFSETS[5][1] =  0  \f$ \n
 #
 # \image html inflows.png "meaning of #inflows list elements" width=2cm
 #
 def new_inflows(mat_fd):
-    """TODO.
+    """Build the inflows mask from the flow direction raster.
 
-    :param mat_fd: TODO
+    :param mat_fd: flow direction raster
+    :return: np ndarray of bools of shape (8, r, c)
     """
-    direction = [128, 64, 32, 16, 8, 4, 2, 1]
+    # masked cells never drain into their neighbours
+    return _compute_inflows(
+        np.asarray(ma.filled(mat_fd, 0)), OFFSETS, DIRECTIONS
+    )
 
-    r = mat_fd.shape[0]
-    c = mat_fd.shape[1]
 
-    in_fldir = ma.masked_array(np.zeros([r, c], int), mask=GridGlobals.masks)
+def _downstream_edges(fd):
+    """Build array of edges pointing from each cell to its downstream cell.
+
+    Edges of cells draining outside of the raster (or not draining at all)
+    point to sentinel node r * c.
 
-    inflows = []  # np.zeros(mat_a[r,c],float)
+    :param fd: flow direction raster (np ndarray)
+    :return: np ndarray of flat indices of the downstream cells
+    """
+    r = fd.shape[0]
+    c = fd.shape[1]
+    size = r * c
 
-    for i in range(r):
-        inflows.append([])
+    codes = fd.ravel()
+    in_lut = (codes >= 0) & (codes < 256)
+    codes = np.where(in_lut, codes, 0).astype(np.intp)
+    rows, cols = np.divmod(np.arange(size), c)
+    end_rows = rows + DOWNSTREAM_LUT[codes, 0]
+    end_cols = cols + DOWNSTREAM_LUT[codes, 1]
+    valid = in_lut & HAS_DOWNSTREAM[codes] & \
+        (end_rows >= 0) & (end_rows < r) & (end_cols >= 0) & (end_cols < c)
 
-        for j in range(c):
-            in_dir = __directionsInflow(mat_fd, i, j)
-            in_fldir[i][j] = in_dir
-            inflow = __directions(in_dir, direction)
-            inflows[i].append(inflow)
+    return np.where(valid, end_rows * c + end_cols, size)
 
-    return inflows
 
+def build_traversal_order(mat_fd):
+    """Order the raster cells from the upstream cells down to the outlets.
 
-def __directionsInflow(mat_fd, i, j):
-    """TODO.
+    Cells without any inflow enter a queue first, a cell enters the queue
+    when all the cells draining into it have been processed. Each cell is
+    therefore preceded by all of its upstream cells. Cells inside flow
+    direction loops are never reached and are omitted.
 
-    :param mat_fd: TODO
-    :param i: TODO
-    :param j: TODO
+    :param mat_fd: flow direction raster
+    :return: np ndarray of shape (N, 2) with i, j indices of the cells
     """
-    coco = [[-1, 1, 8], [-1, 0, 4], [-1, -1, 2], [0, -1, 1],
-            [1, -1, 128], [1, 0, 64], [1, 1, 32], [0, 1, 16]]
-    inflows = 0
+    fd = np.asarray(ma.filled(mat_fd, 0))
+    size = fd.size
 
-    for k in range(len(coco)):
-        a = i + coco[k][0]
-        b = j + coco[k][1]
-        try:
-            value = mat_fd[a][b]
-        except IndexError:
-            value = -1
-        if value == coco[k][2]:
-            inflows = inflows + value
+    edges = _downstream_edges(fd).tolist()
+    in_degree = np.bincount(edges, minlength=size + 1).tolist()
+    queue = deque(k for k in range(size) if in_degree[k] == 0)
+
+    order = np.empty(size, np.intp)
+    n = 0
+    while queue:
+        k = queue.popleft()
+        order[n] = k
+        n += 1
+
+        # the sentinel node is never released
+        downstream = edges[k]
+        if downstream < size:
+            in_degree[downstream] -= 1
+            if in_degree[downstream] == 0:
+                queue.append(downstream)
+
+    return np.stack(np.divmod(order[:n], fd.shape[1]), axis=1)
 
-    return inflows
 
+def flow_accumulation(mat_fd, weights=None):
+    """Compute flow accumulation of the flow direction raster.
 
-def __directions(inflow, direction):
-    """TODO.
+    The raster is converted into an array of edges pointing from each cell
+    to its downstream cell. The accumulation is then propagated layer by
+    layer starting from the cells without any inflow.
 
-    :param inflow: TODO
-    :param direction: TODO
+    :param mat_fd: flow direction raster
+    :param weights: weight of each cell (np ndarray of the raster shape),
+        ones if not given
+    :return: np ndarray of accumulated weights including the cell itself
     """
-    y = 0
-    co = [[1, -1], [1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1], [0, -1]]
-    cellin = []
-    for z in direction:
-        if inflow >= z:
-            cellin.append(co[y])
-            inflow = inflow - direction[y]
-            y += 1
-        else:
-            y += 1
-
-    return cellin
+    fd = np.asarray(ma.filled(mat_fd, 0))
+    size = fd.size
+
+    edges = _downstream_edges(fd)
+    if weights is None:
+        flow_acc = np.ones(size + 1, float)
+    else:
+        flow_acc = np.append(
+            np.asarray(ma.filled(weights, 0), float).ravel(), 0.0
+        )
+    in_degree = np.bincount(edges, minlength=size + 1)
+
+    startnodes = np.flatnonzero(in_degree[:size] == 0)
+    endnodes = edges[startnodes]
+    while startnodes.size:
+        np.add.at(flow_acc, endnodes, flow_acc[startnodes])
+        np.subtract.at(in_degree, endnodes, 1)
+        # the sentinel node is never released
+        uniq = np.unique(endnodes[endnodes != size])
+        startnodes = uniq[in_degree[uniq] == 0]
+        endnodes = edges[startnodes]
+
+    return flow_acc[:size].reshape(fd.shape)
+
+
+def inflow_dirs(mat_fd):
+    """Build inflow direction vectors of all cells of the raster.
+
+    See inflow_dir() for the vector definition.
+
+    :param mat_fd: flow direction raster
+    :return: np ndarray of shape (r * c, 8), row j + i * c belongs to the
+        cell i, j
+    """
+    inflow_mask = _compute_inflows(
+        np.asarray(ma.filled(mat_fd, 0)), COCO_OFFSETS, COCO_DIRECTIONS
+    )
+
+    return np.ascontiguousarray(inflow_mask.reshape(8, -1).T)
+
 
 def inflow_dir(mat_fd, i, j):
-    inflow_dirs = np.zeros(8, float)
-    
-    # inflow matrix stores the information about the inflow directions (0 if there is no inflow, 1 if there is inflow from the direction) 
+    inflow_dirs = np.zeros(8, bool)
+
+    # inflow matrix stores the information about the inflow directions (False if there is no inflow, True if there is inflow from the direction)
     # 32  64  128
     # 16      1
     # 8   4   2
-    
 
-    coco = [[-1, 1, 8], [-1, 0, 4], [-1, -1, 2], [0, -1, 1],
-            [1, -1, 128], [1, 0, 64], [1, 1, 32], [0, 1, 16]]
-    pocet = len(coco)
-    for k in range(pocet):
+    r = mat_fd.shape[0]
+    c = mat_fd.shape[1]
+    for k in range(len(coco)):
         a = i + coco[k][0]
         b = j + coco[k][1]
-        if a < 0 or b < 0:
-                value = -1
-        else:        
-            try:
-                value = mat_fd[a][b]
-            except IndexError:
-                value = -1        
-        
-        if value == coco[k][2]:
-            inflow_dirs[k] = 1.0   
+        if 0 <= a < r and 0 <= b < c and mat_fd[a][b] == coco[k][2]:
+            inflow_dirs[k] = True
     return inflow_dirs
@@ -4,7 +4,6 @@ import os
 import sys
 import shutil
 import math
-import pickle
 import logging
 import numpy as np
 import numpy.ma as ma
@@ -16,6 +15,7 @@ from smoderp2d.core.general import GridGlobals, DataGlobals, Globals
 from smoderp2d.exceptions import ProviderError, ConfigError, GlobalsNotSet, \
     SmoderpError
 from smoderp2d.providers import Logger
+from smoderp2d.providers.base import pickle_data
 from smoderp2d.providers.base.exceptions import DataPreparationError
 
 
@@ -481,6 +481,9 @@ class BaseProvider(object):
     def save_data(data, filename):
         """Save data into pickle.
 
+        Data are stored in the format of the pickle_data module, use
+        pickle_data.load() to read them.
+
         :param filename: TODO
         """
         if filename is None:
@@ -490,7 +493,8 @@ class BaseProvider(object):
             os.makedirs(dirname)
 
         with open(filename, 'wb') as fd:
-            pickle.dump(data, fd, protocol=2)
+            # numpy arrays are stored as out-of-band buffers
+            pickle_data.dump(data, fd)
         Logger.info('Data preparation results stored in <{}> ({} bytes)'.format(
             filename, sys.getsizeof(data)
         ))
@@ -508,7 +512,7 @@ class BaseProvider(object):
             data = {
                 key.decode() if isinstance(key, bytes) else key:
                 val.decode() if isinstance(val, bytes) else val
-                for key, val in pickle.load(fd, encoding='bytes').items()
+                for key, val in pickle_data.load(fd, encoding='bytes').items()
             }
         Logger.debug('Size of loaded data is {} bytes'.format(
             sys.getsizeof(data))
@@ -26,26 +26,19 @@ class PrepareDataBase(ABC):
         :param mat_slope:
         :return: np ndarray for mat_aa
         """
-        mat_aa = np.zeros(
-            [r, c], float
-        )
+        valid = (mat_nsheet != no_data) & (mat_y != no_data) & \
+            (mat_slope != no_data)
+        zero_slope = mat_slope == 0.0
+        compute = valid & ~zero_slope
 
-        # calculating the "a" parameter
-        for i in range(r):
-            for j in range(c):
-                slope = mat_slope[i][j]
-                par_nsheet = mat_nsheet[i][j]
-                par_y = mat_y[i][j]
-
-                if par_nsheet == no_data or par_y == no_data or slope == no_data:
-                    par_aa = no_data
-                elif par_nsheet == no_data or par_y == no_data or slope == 0.0:
-                    par_aa = 0.0001
-                else:
-                    exp = np.power(slope, par_y)
-                    par_aa = 1 / mat_nsheet[i][j] * exp
+        mat_aa = np.full(np.shape(mat_slope), no_data, float)
+        mat_aa[valid & zero_slope] = 0.0001
 
-                mat_aa[i][j] = par_aa
+        # calculating the "a" parameter in place (only the computed cells)
+        np.power(mat_slope, mat_y, out=mat_aa, where=compute)
+        inv_n = np.ones_like(mat_aa)
+        np.divide(1, mat_nsheet, out=inv_n, where=compute)
+        np.multiply(inv_n, mat_aa, out=mat_aa, where=compute)
 
         return mat_aa
 
@@ -53,45 +46,38 @@ class PrepareDataBase(ABC):
     def _get_crit_water(mat_b, mat_tau, mat_v, r, c, mat_slope,
                         no_data_value, mat_aa):
         # critical water level
-        mat_hcrit_tau = np.zeros([r, c], float)
-        mat_hcrit_v = np.zeros([r, c], float)
-        mat_hcrit_flux = np.zeros([r, c], float)
-        mat_hcrit = np.zeros([r, c], float)
-
-        for i in range(r):
-            for j in range(c):
-                if mat_slope[i][j] != no_data_value \
-                   and mat_tau[i][j] != no_data_value:
-                    slope = mat_slope[i][j]
-                    tau_crit = mat_tau[i][j]
-                    v_crit = mat_v[i][j]
-                    b = mat_b[i][j]
-                    aa = mat_aa[i][j]
-                    flux_crit = tau_crit * v_crit
-                    exp = 1 / (b - 1)
-
-                    if slope == 0.0:
-                        hcrit_tau = hcrit_v = hcrit_flux = 1000
-                        # set come auxiliary high value for zero slope
-                    else:
-                        hcrit_v = np.power((v_crit / aa), exp)
-                        # h critical from v
-                        hcrit_tau = tau_crit / 9807 / slope
-                        # h critical from tau
-                        hcrit_flux = np.power(
-                            (flux_crit / slope / 9807 / aa), (1 / mat_b[i][j])
-                        )  # kontrola jednotek
-
-                    mat_hcrit_tau[i][j] = hcrit_tau
-                    mat_hcrit_v[i][j] = hcrit_v
-                    mat_hcrit_flux[i][j] = hcrit_flux
-                    hcrit = min(hcrit_tau, hcrit_v, hcrit_flux)
-                    mat_hcrit[i][j] = hcrit
-                else:
-                    mat_hcrit_tau[i][j] = no_data_value
-                    mat_hcrit_v[i][j] = no_data_value
-                    mat_hcrit_flux[i][j] = no_data_value
-                    mat_hcrit[i][j] = no_data_value
+        valid = ma.filled(
+            (mat_slope != no_data_value) & (mat_tau != no_data_value), False
+        )
+        zero_slope = mat_slope == 0.0
+        compute = valid & ~zero_slope
+
+        mat_hcrit = np.full([r, c], no_data_value, float)
+        # set come auxiliary high value for zero slope
+        mat_hcrit[valid & zero_slope] = 1000
+
+        slope = ma.getdata(mat_slope)[compute]
+        tau_crit = ma.getdata(mat_tau)[compute]
+        v_crit = ma.getdata(mat_v)[compute]
+        b = ma.getdata(mat_b)[compute]
+        aa = ma.getdata(mat_aa)[compute]
+        flux_crit = tau_crit * v_crit
+        exp = 1 / (b - 1)
+
+        # powers are computed at once for all the cells
+        # h critical from v
+        hcrit_v = np.power((v_crit / aa), exp)
+        # h critical from tau
+        hcrit_tau = tau_crit / 9807 / slope
+        # h critical from flux
+        hcrit_flux = np.power(
+            (flux_crit / slope / 9807 / aa), (1 / b)
+        )  # kontrola jednotek
+
+        # hcrit_tau is always finite, NaN of no data cells is skipped
+        mat_hcrit[compute] = np.fmin(
+            np.fmin(hcrit_tau, hcrit_v), hcrit_flux
+        )
 
         return mat_hcrit
 
@@ -158,30 +144,12 @@ class PrepareDataBase(ABC):
         :param mat_boundary: TODO
         :return: TODO
         """
-        nr = range(r)
-        nc = range(c)
-
-        rr = []
-        rc = []
-
-        rr_insert = False
-
-        for i in nr:
-            one_col = []
-            for j in nc:
-
-                if mat_boundary[i][j] == -99:
-                    one_col.append(j)
-                    rr_insert = True
-
-                elif mat_boundary[i][j] == 0.0:
-                    one_col.append(j)
-                    rr_insert = True
+        inside = ma.filled(
+            (mat_boundary == -99) | (mat_boundary == 0.0), False
+        )
 
-            if rr_insert is True:
-                rr.append(i)
-            rr_insert = False
-            rc.append(one_col)
+        rr = np.flatnonzero(inside.any(axis=1)).tolist()
+        rc = [np.flatnonzero(one_col).tolist() for one_col in inside]
 
         return rr, rc
 
@@ -0,0 +1,104 @@
+"""Pickle data with numpy arrays stored as out-of-band buffers.
+
+Data are pickled by protocol 5, the raw buffers of the numpy arrays are
+not copied into the pickle stream but appended after it. Each buffer
+starts at an offset aligned to ALIGNMENT bytes. The file ends with a
+trailer defining the buffer offsets and sizes:
+
+    pickle stream | pad | buffer | pad | buffer ... |
+    uint64 offsets | uint64 sizes | uint64 count | MAGIC
+
+MAGIC ends with the format version. Files without the trailer (plain
+pickles) are loaded as usual. Files written by dump() cannot be read by
+plain pickle.load() (and therefore by releases older than this format),
+use load() instead.
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+VERSION = 2
+MAGIC = b'SM2DBUF' + bytes([VERSION])
+# size of the uint64 integers in the trailer
+INT_SIZE = 8
+# buffers start at offsets aligned to a cache line (and to any dtype)
+ALIGNMENT = 64
+
+
+def dump(data, fd):
+    """Pickle data into the file.
+
+    :param data: data to be pickled
+    :param fd: file object opened in binary mode for writing
+    """
+    buffers = []
+    stream = pickle.dumps(data, protocol=5, buffer_callback=buffers.append)
+    fd.write(stream)
+
+    position = len(stream)
+    offsets = []
+    sizes = []
+    for buf in buffers:
+        raw = buf.raw()
+        pad = -position % ALIGNMENT
+        fd.write(bytes(pad))
+        position += pad
+        fd.write(raw)
+        offsets.append(position)
+        sizes.append(raw.nbytes)
+        position += raw.nbytes
+
+    fd.write(np.array(offsets, '<u8').tobytes())
+    fd.write(np.array(sizes, '<u8').tobytes())
+    fd.write(len(sizes).to_bytes(INT_SIZE, 'little'))
+    fd.write(MAGIC)
+
+
+def _read_aligned(fd):
+    """Read the rest of the file into a buffer aligned to ALIGNMENT bytes.
+
+    :param fd: file object opened in binary mode for reading
+    :return: np ndarray of uint8
+    """
+    size = os.fstat(fd.fileno()).st_size - fd.tell()
+    raw = np.empty(size + ALIGNMENT, np.uint8)
+    shift = -raw.ctypes.data % ALIGNMENT
+    content = raw[shift:shift + size]
+    fd.readinto(memoryview(content))
+
+    return content
+
+
+def load(fd, encoding='ASCII'):
+    """Unpickle data from the file.
+
+    The numpy arrays share the memory of the loaded buffers, no extra copy
+    is made.
+
+    :param fd: file object opened in binary mode for reading
+    :param encoding: encoding of 8-bit string instances pickled by Python 2
+    :return: unpickled data
+    """
+    view = memoryview(_read_aligned(fd))
+    if len(view) < len(MAGIC) or \
+       bytes(view[-len(MAGIC):-1]) != MAGIC[:-1]:
+        return pickle.loads(view, encoding=encoding)
+    if view[-1] != VERSION:
+        raise pickle.UnpicklingError(
+            "Unsupported saved data format version {}".format(view[-1])
+        )
+
+    end = len(view) - len(MAGIC) - INT_SIZE
+    count = int.from_bytes(view[end:end + INT_SIZE], 'little')
+    sizes_start = end - count * INT_SIZE
+    offsets_start = sizes_start - count * INT_SIZE
+    sizes = np.frombuffer(view[sizes_start:end], '<u8').tolist()
+    offsets = np.frombuffer(view[offsets_start:sizes_start], '<u8').tolist()
+    buffers = [
+        view[offset:offset + size] for offset, size in zip(offsets, sizes)
+    ]
+
+    # bytes following the pickle stream are ignored by the unpickler
+    return pickle.loads(view, encoding=encoding, buffers=buffers)
@@ -1,17 +1,42 @@
 import os
-import sys
 import csv
 import numpy as np
 
-from configparser import NoSectionError, NoOptionError
+from configparser import NoSectionError
+from dataclasses import dataclass, field, fields
 
 from smoderp2d.core.general import Globals
 from smoderp2d.core import CompType
+from smoderp2d.processes import rainfall
 from smoderp2d.providers.base import BaseProvider
 from smoderp2d.providers.base.data_preparation import PrepareDataBase
 from smoderp2d.providers.cmd import CmdWriter, CmdArgumentParser
 from smoderp2d.exceptions import ConfigError, ProviderError
 
+# matrices allocated by the profile1d provider
+MAT_NAMES = (
+    'mat_b', 'mat_stream_reach', 'mat_a', 'mat_slope', 'mat_n',
+    # dem is not needed for computation
+    'mat_dem',
+    'mat_inf_index', 'mat_hcrit', 'mat_aa', 'mat_reten', 'mat_nan',
+    'mat_effect_cont', 'mat_pi', 'mat_boundary', 'mat_ppl'
+)
+
+
+@dataclass(frozen=True)
+class Profile1DParams:
+    """Typed options of the profile1d config file.
+
+    Field metadata defines the config section of the option.
+    """
+    data1d: str = field(metadata={'section': 'data'})
+    data1d_soil_types: str = field(metadata={'section': 'data'})
+    rainfall: str = field(metadata={'section': 'data'})
+    endtime: float = field(metadata={'section': 'time'})
+    maxdt: float = field(metadata={'section': 'time'})
+    res: float = field(metadata={'section': 'domain'})
+    slope_width: float = field(metadata={'section': 'domain'})
+
 
 class Profile1DProvider(BaseProvider, PrepareDataBase):
     def __init__(self, config_file=None):
@@ -35,7 +60,7 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
         :param str filename_indata: input CSV file
         :param str filename_soil_types: soil types CSV file
 
-        :return: loaded data in numpy structured array
+        :return: loaded data as dict of columns
         """
         indata = self._load_csv_data(filename_indata)
         soil_types = self._load_csv_data(filename_soil_types)
@@ -69,55 +94,46 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
 
         :param indata: Data with slope attributes from input CSV file
         :param soil_types: Data with soil type attributes from input CSV file
-        :return: joint and filtered data in numpy structured array
+        :return: joint and filtered data as dict of columns
         """
-        from numpy.lib.recfunctions import append_fields
-
-        filtered_soilvegs = None
         try:
-            soil_types_soilveg = soil_types['soilVeg']
+            soil_types_soilveg = soil_types['soilVeg'].astype(str)
+            soilvegs = np.char.add(indata['soilType'].astype(str),
+                                   indata['surfaceProtection'].astype(str))
         except ValueError as e:
             raise ProviderError(e)
 
-        for index in range(len(indata)):
-            try:
-                soilveg = indata['soilType'][index] + \
-                    indata['surfaceProtection'][index]
-            except ValueError as e:
-                raise ProviderError(e)
-
-            # check for the misusage of comma for deciamls
-            if any([',' in i for i in indata[index] if isinstance(i, str)]):
+        # check for the misusage of comma for deciamls
+        for name in indata.dtype.names:
+            if indata[name].dtype.kind == 'U' and \
+               np.any(np.char.find(indata[name], ',') >= 0):
                 raise ConfigError(
                     'Commas are not allowed characters in the data-data1d '
                     'CSV file. If used as decimal separators, please replace '
                     'them with dots')
 
-            if soilveg not in soil_types_soilveg:
-                raise ConfigError(
-                    'soilveg {} from the data-data1d CSV file does not '
-                    'match any soilveg from the data-data1d_soil_types CSV '
-                    'file'.format(soilveg)
-                )
-
-            soilveg_line = soil_types[np.where(soil_types_soilveg == soilveg)]
-
-            if filtered_soilvegs is not None:
-                filtered_soilvegs = np.concatenate((filtered_soilvegs,
-                                                    soilveg_line))
-            else:
-                filtered_soilvegs = soilveg_line
+        # find soil type line for each soilveg at once
+        order = np.argsort(soil_types_soilveg, kind='stable')
+        sorted_soilvegs = soil_types_soilveg[order]
+        positions = np.searchsorted(sorted_soilvegs, soilvegs)
+        matched = positions < len(sorted_soilvegs)
+        matched[matched] = \
+            sorted_soilvegs[positions[matched]] == soilvegs[matched]
+        if not matched.all():
+            raise ConfigError(
+                'soilveg {} from the data-data1d CSV file does not '
+                'match any soilveg from the data-data1d_soil_types CSV '
+                'file'.format(soilvegs[~matched][0])
+            )
 
-        try:
-            soil_types_fields = filtered_soilvegs.dtype.names
-        except AttributeError:
+        if len(soilvegs) == 0:
             raise ProviderError("Invalid input data. Empty joined dataset.")
 
-        result = append_fields(
-            indata,
-            filtered_soilvegs.dtype.names,
-            [filtered_soilvegs[name] for name in soil_types_fields],
-            usemask=False
+        # only index the columns, no structured array is rebuilt
+        idx = order[positions]
+        result = {name: indata[name] for name in indata.dtype.names}
+        result.update(
+            {name: soil_types[name][idx] for name in soil_types.dtype.names}
         )
 
         return result
@@ -127,66 +143,63 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
 
         :return dict: loaded data
         """
-        from smoderp2d.processes import rainfall
+        # read config options only once
+        params = self._load_params()
 
         # read input csv files
         try:
             joint_data = self._load_input_data(
-                self._config.get('data', 'data1d'),
-                self._config.get('data', 'data1d_soil_types')
+                params.data1d, params.data1d_soil_types
             )
         except IOError as e:
             raise ProviderError(e)
-        except NoOptionError as e:
-            raise ConfigError(e)
 
         # defaults for profile1d provider
         data = {'type_of_computing': CompType.rill, 'mfda': False}
 
         # time settings
-        try:
-            data['end_time'] = self._config.getfloat('time', 'endtime')
-            data['maxdt'] = self._config.getfloat('time', 'maxdt')
-        except NoSectionError as e:
-            raise ConfigError(e)
+        data['end_time'] = params.endtime
+        data['maxdt'] = params.maxdt
 
         # load precipitation input file
         try:
             data['sr'], data['itera'] = rainfall.load_precipitation(
-                self._config.get('data', 'rainfall')
+                params.rainfall
             )
         except TypeError:
             raise ProviderError('Invalid rainfall file in [data] section')
         # Logger.progress(10)
 
         # general settings
-        resolution = self._config.getfloat('domain', 'res')
         data['r'] = self._compute_rows(joint_data['horizontalProjection[m]'],
-                                       resolution)
+                                       params.res)
         data['c'] = 1
 
         # set cell sizes
-        data['dy'] = data['dx'] = self._config.getfloat('domain', 'res')
+        data['dy'] = data['dx'] = params.res
         data['pixel_area'] = data['dy'] * data['dx']
 
         # divide joint data slope into rows corresponding with data['r']
         parsed_data = self._divide_joint_data(joint_data, data['r'],
                                               data['dy'])
 
-        # allocate matrices
-        self._alloc_matrices(data)
+        # allocate matrices and set their initial values at once
+        self._alloc_matrices(data, {
+            'mat_effect_cont': data['dx'],  # x-axis (EW) resolution
+            'mat_inf_index': 1,  # 1 = philips infiltration
+            # flow direction is always to the south
+            'mat_fd': 4
+        })
 
         # set no data value, likely used in profile1d provider
         data['NoDataValue'] = -9999
 
         # topography
         data['mat_slope'] = self._compute_mat_slope(
-            parsed_data['hor_len'], parsed_data['verticalDistance[m]'])
+            parsed_data['hor_len'], parsed_data['verticalDistance[m]']
+        ).reshape((data['r'], data['c']))
         # TODO can be probably removed (?) or stay zero
         # data['mat_boundary'] = np.zeros((data['r'], data['c']), float)
-        data['mat_effect_cont'].fill(data['dx'])  # x-axis (EW) resolution
-        # flow direction is always to the south
-        data['mat_fd'].fill(4)
 
         # set x and y
         data['nsheet'] = parsed_data['nsheet'].reshape((data['r'], data['c']))
@@ -218,7 +231,6 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
         data['mat_ppl'] = parsed_data['ppl'].reshape((data['r'], data['c']))
 
         data['mat_nan'] = np.nan
-        data['mat_inf_index'].fill(1)  # 1 = philips infiltration
 
         data['mat_inf_index'], data['combinatIndex'] = \
             self._get_inf_combinat_index(
@@ -242,14 +254,50 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
                                        parsed_data['surfaceProtection'])
         self.hor_lengths = parsed_data['hor_len']
 
-        slope_width = float(self._config.get('domain', 'slope_width'))
-        data['slope_width'] = slope_width
+        self.slope_width = params.slope_width
+        data['slope_width'] = self.slope_width
 
         # load hidden config
         data.update(self._load_data_from_hidden_config())
 
         return data
 
+    def _load_config_sections(self, sections):
+        """Read options of the given config sections at once.
+
+        :param sections: list of section names
+        :return dict: options as dict for each section
+        """
+        try:
+            return {
+                section: dict(self._config.items(section))
+                for section in sections
+            }
+        except NoSectionError as e:
+            raise ConfigError(e)
+
+    def _load_params(self):
+        """Read profile1d options from the config file at once.
+
+        :return Profile1DParams: typed config options
+        """
+        params_fields = fields(Profile1DParams)
+        sections = self._load_config_sections(
+            dict.fromkeys(f.metadata['section'] for f in params_fields)
+        )
+
+        values = {}
+        for f in params_fields:
+            section = f.metadata['section']
+            try:
+                values[f.name] = f.type(sections[section][f.name])
+            except KeyError as e:
+                raise ConfigError(
+                    "No option {} in section: '{}'".format(e, section)
+                )
+
+        return Profile1DParams(**values)
+
     @staticmethod
     def _compute_rows(lengths, resolution):
         """Compute number of pixels the slope will be divided into.
@@ -291,13 +339,11 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
     def _divide_joint_data(joint_data, r, res):
         """Divide joint data into corresponding number of rows.
 
-        :param joint_data: np structurred array with the joint data
+        :param joint_data: dict of columns with the joint data
         :param r: number of rows
         :param res: pixel resolution
-        :return: divided, parsed joint data
+        :return: divided, parsed joint data as dict of columns
         """
-        from numpy.lib.recfunctions import merge_arrays
-        parsed_data = None
         subsegment_unseen = 0
 
         hor_length = np.sum(joint_data['horizontalProjection[m]'])
@@ -305,52 +351,47 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
         addition = diff / r
         one_pix_len = res + addition
 
-        for slope_segment in joint_data:
-            segment_length = np.sum(
-                slope_segment['horizontalProjection[m]'])
+        # number of rows each slope segment is divided into
+        seg_rows = np.zeros(len(joint_data['horizontalProjection[m]']), int)
+        for i, segment_length in enumerate(
+                joint_data['horizontalProjection[m]']):
             # seg_r = self._compute_rows(segment_length, one_pix_len)
-
-            seg_hor_len_arr = np.array(
-                [one_pix_len],
-                dtype=[('hor_len', 'f4')])
-            data_entry = merge_arrays(
-                (slope_segment, seg_hor_len_arr),
-                flatten=True)
-
             subsegment_unseen += segment_length
 
             while subsegment_unseen >= (one_pix_len / 2):
-                if parsed_data is not None:
-                    parsed_data = np.concatenate((parsed_data,
-                                                  data_entry[True]))
-                else:
-                    parsed_data = data_entry[True]
-
+                seg_rows[i] += 1
                 subsegment_unseen -= one_pix_len
 
+        parsed_data = {
+            name: np.repeat(column, seg_rows)
+            for name, column in joint_data.items()
+        }
+        parsed_data['hor_len'] = np.full(seg_rows.sum(), one_pix_len, 'f4')
+
         return parsed_data
 
     @staticmethod
-    def _alloc_matrices(data):
-        # TODO: use loop (check base provider)
-        # allocate matrices
-        data['mat_b'] = np.zeros((data['r'], data['c']), float)
-        data['mat_stream_reach'] = np.zeros((data['r'], data['c']), float)
-        data['mat_a'] = np.zeros((data['r'], data['c']), float)
-        data['mat_slope'] = np.zeros((data['r'], data['c']), float)
-        data['mat_n'] = np.zeros((data['r'], data['c']), float)
-        # dem is not needed for computation
-        data['mat_dem'] = np.zeros((data['r'], data['c']), float)
-        data['mat_inf_index'] = np.zeros((data['r'], data['c']), float)
-        data['mat_fd'] = np.zeros((data['r'], data['c']), float)
-        data['mat_hcrit'] = np.zeros((data['r'], data['c']), float)
-        data['mat_aa'] = np.zeros((data['r'], data['c']), float)
-        data['mat_reten'] = np.zeros((data['r'], data['c']), float)
-        data['mat_nan'] = np.zeros((data['r'], data['c']), float)
-        data['mat_effect_cont'] = np.zeros((data['r'], data['c']), float)
-        data['mat_pi'] = np.zeros((data['r'], data['c']), float)
-        data['mat_boundary'] = np.zeros((data['r'], data['c']), float)
-        data['mat_ppl'] = np.zeros((data['r'], data['c']), float)
+    def _alloc_matrices(data, init_values=None):
+        """Allocate matrices and fill them with their initial values.
+
+        :param data: data dict to store the matrices in
+        :param init_values: dict of initial values, zero if not given
+        """
+        init_values = dict(init_values or {})
+        shape = (data['r'], data['c'])
+
+        # flow direction codes fit into one byte
+        data['mat_fd'] = np.full(shape, init_values.pop('mat_fd', 0), np.uint8)
+
+        # allocate matrices as views into one contiguous block filled by a
+        # single broadcast
+        layer_values = np.zeros(len(MAT_NAMES), float)
+        for name, value in init_values.items():
+            layer_values[MAT_NAMES.index(name)] = value
+        block = np.empty((len(MAT_NAMES),) + shape, float)
+        block[:] = layer_values[:, np.newaxis, np.newaxis]
+        for i, name in enumerate(MAT_NAMES):
+            data[name] = block[i]
 
     @staticmethod
     def _set_unused(data):
@@ -380,7 +421,7 @@ class Profile1DProvider(BaseProvider, PrepareDataBase):
 
         # extra to normal postprocessing - write profile.csv
 
-        slope_width = float(self._config.get('domain', 'slope_width'))
+        slope_width = self.slope_width
 
         header = ['length[m]', 'soilVegFID', 'maximalSurfaceFlow[m3/s]',
                   'totalRunoff[m3]', 'maximalSheetRunoffVelocity[m/s]',
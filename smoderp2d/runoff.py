@@ -225,10 +225,6 @@ class Runoff(object):
 
         Logger.info('-' * 80)
 
-        # list of flewdirection vectors - incialization
-        self.r,self.c = GridGlobals.get_dim()
-        self.list_fd = [[] for i in range(self.r*self.c)]
-
     def run(self):
         """Perform the computation of the water level development.
 
@@ -247,12 +243,8 @@ class Runoff(object):
 
         Selected values are stored in at the end of each loop.
         """
-        # creates list of flow direction vectors (r*c vectors of length 8 coposed of 1 and 0) 
-        
-        for i in range(self.r):
-            for j in range(self.c):
-                vec_pos = i * self.c + j
-                self.list_fd[vec_pos] = D8.inflow_dir(Globals.get_mat_fd(),i,j)
+        # creates array of flow direction vectors (r*c bool vectors of length 8)
+        self.list_fd = D8.inflow_dirs(Globals.get_mat_fd())
 
         # saves time before the main loop
         Logger.info('Start of computing...')
@@ -9,10 +9,10 @@
 # bez naciracich metod
 
 
-import pickle
 import os
 
 from tools import SaveItems
+from smoderp2d.providers.base import pickle_data
 
 
 sl = SaveItems()
@@ -23,6 +23,6 @@ for file in os.listdir("./"):
         save = os.path.join("./", file)
         zipn = save.replace(".save", ".zip")
         print("converting ", save.ljust(32), " to ", zipn, "...")
-        f = open(save, 'r')
-        dataList = pickle.load(f)
+        with open(save, 'rb') as f:
+            dataList = pickle_data.load(f)
         sl.save(dataList, zipn)
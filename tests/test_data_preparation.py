@@ -0,0 +1,26 @@
+import numpy as np
+
+from smoderp2d.providers.base.data_preparation import PrepareDataBase
+
+
+class TestDataPreparation:
+    def test_crit_water_no_data_aa(self):
+        # nsheet or y is no data, so 'aa' is no data too
+        no_data = -9999
+        slope, tau, v, b = 0.4, 0.01, 0.5, 1.5
+        mat_aa = np.array([[no_data, 2.0]])
+
+        with np.errstate(invalid='ignore'):
+            mat_hcrit = PrepareDataBase._get_crit_water(
+                np.full([1, 2], b), np.full([1, 2], tau), np.full([1, 2], v),
+                1, 2, np.full([1, 2], slope), no_data, mat_aa
+            )
+
+            # per-cell minimum skipping NaN values as built-in min() does
+            for aa, hcrit in zip(mat_aa.ravel(), mat_hcrit.ravel()):
+                assert hcrit == min(
+                    tau / 9807 / slope,
+                    np.power(v / aa, 1 / (b - 1)),
+                    np.power(tau * v / slope / 9807 / aa, 1 / b)
+                )
+        assert np.isfinite(mat_hcrit).all()
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import smoderp2d.flow_algorithm.D8 as D8
+
+
+def _random_fd(seed, shape=(13, 17)):
+    """Build flow direction raster draining to the lowest lower neighbour.
+
+    Water always flows downhill, so the raster has no flow direction loops.
+    """
+    rng = np.random.default_rng(seed)
+    dem = rng.random(shape)
+    r, c = shape
+
+    mat_fd = np.zeros(shape, np.uint8)
+    for i in range(r):
+        for j in range(c):
+            lowest = dem[i, j]
+            for (m, n), code in zip(-D8.OFFSETS.astype(int), D8.DIRECTIONS):
+                a = i + m
+                b = j + n
+                if 0 <= a < r and 0 <= b < c and dem[a, b] < lowest:
+                    lowest = dem[a, b]
+                    mat_fd[i, j] = code
+
+    return mat_fd
+
+
+def _downstream(mat_fd, i, j):
+    """Return downstream cell of the cell i, j or None."""
+    code = mat_fd[i, j]
+    if code not in D8.DIRECTIONS:
+        return None
+    m, n = D8.DOWNSTREAM_LUT[code]
+    a = i + m
+    b = j + n
+    if 0 <= a < mat_fd.shape[0] and 0 <= b < mat_fd.shape[1]:
+        return a, b
+
+    return None
+
+
+def _naive_flow_accumulation(mat_fd, weights):
+    """Add weight of each cell to all the cells down its flow path."""
+    flow_acc = np.zeros(mat_fd.shape, float)
+    for i in range(mat_fd.shape[0]):
+        for j in range(mat_fd.shape[1]):
+            cell = (i, j)
+            while cell is not None:
+                flow_acc[cell] += weights[i, j]
+                cell = _downstream(mat_fd, *cell)
+
+    return flow_acc
+
+
+KERNELS = [
+    D8._compute_inflows_numpy,
+    pytest.param(
+        D8._compute_inflows_numba,
+        marks=pytest.mark.skipif(
+            D8._compute_inflows_numba is None, reason="numba not installed"
+        )
+    )
+]
+
+
+class TestD8:
+    @pytest.mark.parametrize("dtype", [np.uint8, float])
+    @pytest.mark.parametrize("kernel", KERNELS)
+    def test_compute_inflows(self, kernel, dtype):
+        rng = np.random.default_rng(0)
+        mat_fd = rng.choice(
+            np.append(D8.DIRECTIONS, 0), size=(11, 7)
+        ).astype(dtype)
+
+        inflow_mask = kernel(mat_fd, D8.COCO_OFFSETS, D8.COCO_DIRECTIONS)
+
+        for i in range(mat_fd.shape[0]):
+            for j in range(mat_fd.shape[1]):
+                np.testing.assert_array_equal(
+                    inflow_mask[:, i, j], D8.inflow_dir(mat_fd, i, j)
+                )
+        np.testing.assert_array_equal(
+            kernel(mat_fd, D8.OFFSETS, D8.DIRECTIONS),
+            D8._compute_inflows_numpy(mat_fd, D8.OFFSETS, D8.DIRECTIONS)
+        )
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_traversal_order(self, seed):
+        mat_fd = _random_fd(seed)
+
+        order = D8.build_traversal_order(mat_fd)
+        position = {tuple(cell): k for k, cell in enumerate(order.tolist())}
+
+        assert len(position) == mat_fd.size
+        for (i, j), k in position.items():
+            downstream = _downstream(mat_fd, i, j)
+            if downstream is not None:
+                assert position[downstream] > k
+
+    def test_traversal_order_loop(self):
+        # two cells draining into each other are never reached
+        mat_fd = np.array([[1, 16, 0]], np.uint8)
+
+        order = D8.build_traversal_order(mat_fd)
+
+        assert order.tolist() == [[0, 2]]
+
+    @pytest.mark.parametrize("seed", range(5))
+    def test_flow_accumulation(self, seed):
+        mat_fd = _random_fd(seed)
+        weights = np.random.default_rng(seed).random(mat_fd.shape)
+
+        np.testing.assert_array_equal(
+            D8.flow_accumulation(mat_fd),
+            _naive_flow_accumulation(mat_fd, np.ones(mat_fd.shape))
+        )
+        np.testing.assert_allclose(
+            D8.flow_accumulation(mat_fd, weights),
+            _naive_flow_accumulation(mat_fd, weights)
+        )
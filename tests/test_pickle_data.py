@@ -0,0 +1,41 @@
+import pickle
+
+import numpy as np
+
+from smoderp2d.providers.base import pickle_data
+
+
+class TestPickleData:
+    def test_roundtrip_aligned(self, tmp_path):
+        data = {
+            'mat_a': np.arange(5.),
+            'mat_f': np.asfortranarray(np.arange(12.).reshape(3, 4)),
+            'mat_fd': np.arange(7, dtype=np.uint8),
+            'outdir': 'output',
+            'bc': None,
+        }
+        filename = tmp_path / 'dpre.save'
+        with open(filename, 'wb') as fd:
+            pickle_data.dump(data, fd)
+        with open(filename, 'rb') as fd:
+            loaded = pickle_data.load(fd)
+
+        assert loaded.keys() == data.keys()
+        for key, value in data.items():
+            if isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(loaded[key], value)
+                assert loaded[key].flags.aligned
+                assert loaded[key].ctypes.data % pickle_data.ALIGNMENT == 0
+                assert loaded[key].flags.writeable
+            else:
+                assert loaded[key] == value
+        assert loaded['mat_f'].flags.f_contiguous
+
+    def test_load_plain_pickle(self, tmp_path):
+        filename = tmp_path / 'dpre.save'
+        with open(filename, 'wb') as fd:
+            pickle.dump({'mat_a': np.ones(3)}, fd, protocol=2)
+        with open(filename, 'rb') as fd:
+            loaded = pickle_data.load(fd)
+
+        np.testing.assert_array_equal(loaded['mat_a'], np.ones(3))
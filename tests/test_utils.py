@@ -3,23 +3,72 @@ import sys
 import configparser
 import filecmp
 import logging
-import glob
-import pickle
+import fnmatch
 import math
+import functools
+import hashlib
+import tempfile
+import itertools
+import atexit
+import threading
 import pytest
 from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor
 from difflib import unified_diff
 
 import numpy as np
+import numpy.ma as ma
 
-from smoderp2d.providers.base import WorkflowMode
+try:
+    import pandas as pd
+except ImportError:
+    # pandas is optional, np.loadtxt is used instead
+    pd = None
+
+try:
+    from osgeo import gdal
+except ImportError:
+    # grids with Esri header are parsed as text instead
+    gdal = None
+
+from smoderp2d.providers.base import WorkflowMode, pickle_data
 from smoderp2d.providers import Logger
 
+# https://docs.github.com/en/actions/learn-github-actions/variables
+_ON_GITHUB_ACTION = "GITHUB_ACTION" in os.environ
+
+# parsed reference .asc grids are stored there as .npy files, the
+# directory is private to the test session and removed at its end
+_grid_cache_dir = None
+_grid_cache_lock = threading.Lock()
+
+
+def _get_grid_cache_dir():
+    global _grid_cache_dir
+
+    with _grid_cache_lock:
+        if _grid_cache_dir is None:
+            _grid_cache_dir = tempfile.mkdtemp(prefix='smoderp2d_test_grids_')
+            atexit.register(rmtree, _grid_cache_dir, ignore_errors=True)
+
+    return _grid_cache_dir
+
+
+# figure reused for all the diff images
+_diff_fig = None
+
 
 def write_array_diff_png(diff, target_path):
-    import matplotlib.pyplot as plt
+    global _diff_fig
     import matplotlib.colors as mcolors
 
+    if _diff_fig is None:
+        import matplotlib
+        # no interactive backend is needed
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        _diff_fig = plt.figure()
+
     vmin = diff.min()
     if vmin > 0:
         vmin *= -1
@@ -32,13 +81,46 @@ def write_array_diff_png(diff, target_path):
         norm = mcolors.TwoSlopeNorm(vmin=vmin, vcenter=vcenter, vmax=vmax)
     else:
         norm = None
-    plt.imshow(diff.astype(int), cmap="bwr", norm=norm)
-    plt.colorbar()
-    plt.savefig(os.path.join(target_path + ".diff.png"))
-    plt.clf()
+    ax = _diff_fig.add_subplot()
+    image = ax.imshow(diff.astype(int), cmap="bwr", norm=norm)
+    _diff_fig.colorbar(image, ax=ax)
+    _diff_fig.savefig(os.path.join(target_path + ".diff.png"))
+    # the colorbar axes are removed too
+    _diff_fig.clf()
+
+
+def _diff_stats(diff, block_size=1 << 16):
+    """Compute min, max and mean of the diff in one pass.
+
+    The diff is traversed by blocks small enough to stay in the cache while
+    all the three statistics are computed.
+
+    :param diff: np ndarray or masked array (not empty)
+    :param block_size: number of elements of one block
+    :return: tuple of min, max and mean (masked if all the values are
+        masked)
+    """
+    # masked values are left out of the statistics
+    flat = ma.compressed(diff)
+    if flat.size == 0:
+        return ma.masked, ma.masked, ma.masked
+    diff_min = np.inf
+    diff_max = -np.inf
+    diff_sum = 0.0
+    for start in range(0, flat.size, block_size):
+        block = flat[start:start + block_size]
+        diff_min = min(diff_min, block.min())
+        diff_max = max(diff_max, block.max())
+        diff_sum += np.add.reduce(block)
+
+    return diff_min, diff_max, diff_sum / flat.size
 
 
 def write_array_diff(arr1, arr2, target_path):
+    # no diff is allocated for equal arrays
+    if np.array_equal(arr1, arr2):
+        return
+
     try:
         diff = arr1 - arr2
     except ValueError as e:
@@ -56,14 +138,220 @@ def write_array_diff(arr1, arr2, target_path):
 
     # print statistics
     sys.stdout.writelines("\tdiff_stats ({}) min: {} max: {} mean:{}\n".format(
-        os.path.basename(target_path), diff.min(), diff.max(), diff.mean()))
+        os.path.basename(target_path), *_diff_stats(diff)))
 
-    with open(target_path + ".diff", "w") as fd:
-        np.savetxt(fd, diff)
+    # masked arrays cannot be saved as such
+    np.save(target_path + ".diff.npy", ma.getdata(diff))
 
     write_array_diff_png(diff, target_path)
 
 
+def _read_gdal_array(filename):
+    if gdal is None:
+        raise ImportError("GDAL is required to read {}".format(filename))
+    ds = gdal.Open(filename, gdal.GA_ReadOnly)
+    array = ds.GetRasterBand(1).ReadAsArray()
+    ds = None
+    return array
+
+
+def _read_asc_header(filename):
+    """Read header of the Esri ASCII grid.
+
+    :param filename: path to the grid
+    :return: dict of the header values (keys in lowercase), empty for grids
+        without the header
+    """
+    header = {}
+    with open(filename) as f:
+        if f.read(len('ncols')) != 'ncols':
+            return header
+        f.seek(0)
+        # the header has five or six lines
+        for line in itertools.islice(f, 6):
+            fields = line.split()
+            if len(fields) != 2 or not fields[0][0].isalpha():
+                break
+            header[fields[0].lower()] = float(fields[1])
+
+    return header
+
+
+def _read_asc_grid(filename):
+    """Parse values of the ASCII grid at C level.
+
+    The number of columns is taken from the Esri header, from the first
+    line for grids without the header.
+
+    :param filename: path to the grid
+    :return: np ndarray of shape (rows, columns), empty for empty grids
+    """
+    header = _read_asc_header(filename)
+    with open(filename, 'rb') as f:
+        if header:
+            ncols = int(header['ncols'])
+            for _ in range(len(header)):
+                f.readline()
+        else:
+            # the last line may have no trailing newline
+            ncols = len(f.readline().split())
+            f.seek(0)
+        # separator ' ' matches any whitespace including newlines
+        data = np.fromfile(f, sep=' ')
+
+    if data.size == 0:
+        return np.empty(0)
+    if header:
+        return data.reshape(int(header['nrows']), ncols)
+    return data.reshape(-1, ncols)
+
+
+def _parse_data(filename):
+    header_rows = 0
+    delimiter = None
+    # only the beginning of the file is sniffed, lines of wide grids
+    # can be long
+    if filename.endswith('.asc'):
+        # grids written by CmdProvider have no Esri header and cannot
+        # be read by GDAL
+        if gdal is not None:
+            with open(filename) as f:
+                if f.read(len('ncols')) == 'ncols':
+                    return _read_gdal_array(filename)
+        return _read_asc_grid(filename)
+    else:
+        with open(filename) as f:
+            is_point_csv = f.read(len('# Hydro')) == '# Hydro'
+        if is_point_csv:
+            header_rows = 3
+            delimiter = ';'
+
+    if pd is None:
+        return np.loadtxt(filename, skiprows=header_rows, delimiter=delimiter)
+
+    try:
+        return pd.read_csv(
+            filename, skiprows=header_rows, sep=delimiter or r'\s+',
+            header=None, dtype=np.float64, engine='c', na_filter=False
+        ).to_numpy()
+    except pd.errors.EmptyDataError:
+        return np.empty(0)
+
+
+def _load_grid_cached(filename, mtime):
+    """Parse the grid once and memory-map its .npy copy on the next reads.
+
+    Only reference grids are cached, the outputs are generated again by
+    each test. The copy gets the modification time of the grid and is
+    replaced when the grid is modified.
+
+    :param filename: absolute path to the grid
+    :param mtime: modification time of the grid
+    :return: np ndarray (memory-mapped if cached)
+    """
+    key = hashlib.sha1(filename.encode()).hexdigest()
+    cache_path = os.path.join(_get_grid_cache_dir(), key + '.npy')
+    try:
+        if os.stat(cache_path).st_mtime_ns == mtime:
+            return np.load(cache_path, mmap_mode='r')
+    except FileNotFoundError:
+        pass
+
+    array = _parse_data(filename)
+    if array.size == 0:
+        # empty files cannot be memory-mapped
+        return array
+
+    tmp_path = '{}.{}.{}.tmp'.format(
+        cache_path, os.getpid(), threading.get_ident()
+    )
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.utime(tmp_path, ns=(mtime, mtime))
+    os.replace(tmp_path, cache_path)
+
+    return np.load(cache_path, mmap_mode='r')
+
+
+@functools.lru_cache(maxsize=256)
+def _read_reference_cached(filename, mtime):
+    """Parse the reference file only once for its given modification time."""
+    if filename.endswith('.asc'):
+        array = _load_grid_cached(filename, mtime)
+    else:
+        array = _parse_data(filename)
+    # the array is shared by all the callers
+    array.flags.writeable = False
+
+    return array
+
+
+def _read_data(filename, reference=False):
+    # outputs are rewritten at the same paths by each test, possibly within
+    # the timestamp resolution of the filesystem, they are never cached
+    if not reference:
+        return _parse_data(filename)
+
+    return _read_reference_cached(
+        os.path.abspath(filename), os.stat(filename).st_mtime_ns
+    )
+
+
+def _allclose_inplace(a, b, rtol, buffers, atol=1e-8):
+    """Same as np.allclose() but computed in reusable buffers.
+
+    :param a: first array
+    :param b: second array of the same shape
+    :param rtol: relative tolerance
+    :param buffers: dict of preallocated buffers keyed by shape
+    :param atol: absolute tolerance
+    :return: True if all the elements are close
+    """
+    if a.size == 0:
+        return True
+
+    try:
+        diff, tol = buffers[a.shape]
+    except KeyError:
+        diff, tol = buffers[a.shape] = np.empty(a.shape), np.empty(a.shape)
+
+    with np.errstate(invalid='ignore'):
+        np.abs(b, out=tol)
+        tol *= rtol
+        tol += atol
+        np.subtract(a, b, out=diff)
+        np.abs(diff, out=diff)
+        # |a - b| - tol <= 0 exactly when |a - b| <= tol
+        diff -= tol
+        if diff.max() <= 0:
+            return True
+
+    # infinite values (close when equal) and nans are left to numpy
+    return bool(np.allclose(a, b, rtol=rtol, atol=atol))
+
+
+def _list_matching(dirpath, patterns):
+    """List files of the directory matching the patterns.
+
+    The directory is scanned only once for all the patterns. Hidden files
+    are skipped as by glob.glob().
+
+    :param dirpath: directory path
+    :param patterns: list of fnmatch patterns
+    :return: dict of lists of matching file names keyed by the pattern
+    """
+    try:
+        with os.scandir(dirpath) as entries:
+            names = [
+                entry.name for entry in entries
+                if not entry.name.startswith('.')
+            ]
+    except FileNotFoundError:
+        names = []
+
+    return {pattern: fnmatch.filter(names, pattern) for pattern in patterns}
+
+
 def are_dir_trees_equal(dir1, dir2):
     """
     Taken from https://stackoverflow.com/questions/4187564/recursively-compare-two-directories-to-ensure-they-have-the-same-files-and-subdi
@@ -77,28 +365,6 @@ def are_dir_trees_equal(dir1, dir2):
         there were no errors while accessing the directories or files,
         False otherwise.
     """
-    def _read_gdal_array(filename):
-        from osgeo import gdal
-        ds = gdal.Open(filename)
-        array = ds.GetRasterBand(1).ReadAsArray()
-        ds = None
-        return array
-
-    def _read_data(filename):
-        header_rows = 0
-        delimiter = None
-        with open(filename) as f:
-            first_line = f.readline()
-            use_gdal = first_line.startswith('ncols')
-            is_point_csv = first_line.startswith('# Hydro')
-        if use_gdal:
-            return _read_gdal_array(filename)
-        elif is_point_csv:
-            header_rows = 3
-            delimiter = ';'
-
-        return np.loadtxt(filename, skiprows=header_rows, delimiter=delimiter)
-
     def _print_diff_files(same_files, diff_files, output_dir, ref_dir):
         for name in same_files:
             print(
@@ -107,93 +373,109 @@ def are_dir_trees_equal(dir1, dir2):
                 )
             )
         for name in diff_files:
-            diff_file = os.path.join(output_dir, name) + '.diff'
+            output_path = os.path.join(output_dir, name)
+            ref_path = os.path.join(ref_dir, name)
+            diff_file = output_path + '.diff'
             print(
                 "diff_file {} found in {} and {} -> {}".format(
                     name, output_dir, ref_dir, diff_file
                 )
             )
-            with open(os.path.join(output_dir, name)) as left:
-                with open(os.path.join(ref_dir, name)) as right:
-                    if _is_on_github_action():
+            with open(output_path) as left:
+                with open(ref_path) as right:
+                    if _ON_GITHUB_ACTION:
                         fd = sys.stdout
                     else:
                         fd = open(diff_file, 'w')
-                    fd.writelines(
-                        unified_diff(left.readlines(), right.readlines())
-                    )
-                    if not _is_on_github_action():
+                    # diff lines are written as they are generated,
+                    # SequenceMatcher needs both sides as sequences
+                    fd.writelines(unified_diff(list(left), list(right)))
+                    if not _ON_GITHUB_ACTION:
                         fd.close()
 
-            if not _is_on_github_action() and \
-               os.path.splitext(name)[-1] == '.asc':
+            if not _ON_GITHUB_ACTION and \
+               name.endswith('.asc'):
                 write_array_diff(
                     # output generated by CmdProvider/GISProvider
-                    _read_data(os.path.join(output_dir, name)),
+                    _read_data(output_path),
                     # reference generated by GISProvider
-                    _read_data(os.path.join(ref_dir, name)),
-                    os.path.join(output_dir, name)
+                    _read_data(ref_path, reference=True),
+                    output_path
                 )
 
     # https://stackoverflow.com/questions/46281434/python-filecmp-dircmp-ignore-wildcard
     def _ignore_list(left, right):
         ignore_list = ['temp']
         patterns_to_ignore = ['*.prj', '*.aux.xml']
+        left_files = _list_matching(left, patterns_to_ignore)
+        right_files = _list_matching(right, patterns_to_ignore)
         for pattern in patterns_to_ignore:
-            left_files = glob.glob(os.path.join(left, pattern))
-            ignore_left = [
-                os.path.split(expanded)[1] for expanded in left_files
-            ]
-            right_files = glob.glob(os.path.join(right, pattern))
-            ignore_right = [
-                os.path.split(expanded)[1] for expanded in right_files
-            ]
-            ignore_list.extend(ignore_left)
-            ignore_list.extend(ignore_right)
+            ignore_list.extend(left_files[pattern])
+            ignore_list.extend(right_files[pattern])
         return ignore_list
 
     relative_tolerance = 0.0001
     same_files = []
     diff_files = []
 
-    for i in glob.glob(os.path.join(dir1, '*.asc')):
-        file_path = os.path.split(i)[1]
-
-        new_output = _read_data(i)
-        reference = _read_data(os.path.join(dir2, file_path))
-        if new_output.shape == reference.shape:
-            equal = np.allclose(new_output, reference, rtol=relative_tolerance)
-            if equal is True:
-                same_files.append(file_path)
-                continue
-
-        diff_files.append(file_path)
-
-    for i in glob.glob(os.path.join(dir1, 'control', '*.asc')):
-        file_path = os.path.join('control', os.path.split(i)[1])
-
-        new_output = _read_data(i)
-        reference = _read_data(os.path.join(dir2, file_path))
-        if new_output.shape == reference.shape:
-            equal = np.allclose(new_output, reference, rtol=relative_tolerance)
-            if equal is True:
-                same_files.append(file_path)
-                continue
+    # subdirectories and patterns of the compared files
+    patterns = [
+        ('', '*.asc'), ('control', '*.asc'), ('control_point', '*.csv')
+    ]
+    # stop comparing at the first different file, the list of same files is
+    # incomplete then
+    fast_fail = bool(os.environ.get('SMODERP2D_FAST_FAIL'))
+
+    file_paths = []
+    for subdir, pattern in patterns:
+        matching = _list_matching(os.path.join(dir1, subdir), [pattern])
+        file_paths.extend(
+            os.path.join(subdir, name) for name in matching[pattern]
+        )
 
-        diff_files.append(file_path)
+    # comparison buffers are not shared between the threads
+    thread_data = threading.local()
+
+    def _compare_one(file_path):
+        if not hasattr(thread_data, 'buffers'):
+            thread_data.buffers = {}
+        new_path = os.path.join(dir1, file_path)
+        ref_path = os.path.join(dir2, file_path)
+
+        if file_path.endswith('.asc'):
+            # grids of different dimensions are not parsed at all
+            new_header = _read_asc_header(new_path)
+            ref_header = _read_asc_header(ref_path)
+            if new_header and ref_header:
+                new_dims = (new_header['ncols'], new_header['nrows'])
+                if new_dims != (ref_header['ncols'], ref_header['nrows']):
+                    return False
+
+        new_output = _read_data(new_path)
+        reference = _read_data(ref_path, reference=True)
+        if new_output.shape != reference.shape:
+            return False
+        # outputs are mostly bit-identical
+        if new_output.dtype == reference.dtype and \
+           np.array_equal(new_output, reference):
+            return True
+
+        return _allclose_inplace(
+            new_output, reference, relative_tolerance, thread_data.buffers
+        )
 
-    for i in glob.glob(os.path.join(dir1, 'control_point', '*.csv')):
-        file_path = os.path.join('control_point', os.path.split(i)[1])
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = [executor.submit(_compare_one, i) for i in file_paths]
+        for file_path, future in zip(file_paths, futures):
+            if fast_fail and diff_files:
+                for f in futures:
+                    f.cancel()
+                break
 
-        new_output = _read_data(i)
-        reference = _read_data(os.path.join(dir2, file_path))
-        if new_output.shape == reference.shape:
-            equal = np.allclose(new_output, reference, rtol=relative_tolerance)
-            if equal is True:
+            if future.result() is True:
                 same_files.append(file_path)
-                continue
-
-        diff_files.append(file_path)
+            else:
+                diff_files.append(file_path)
 
     assert len(diff_files) == 0, \
         _print_diff_files(
@@ -213,15 +495,42 @@ def class_manager(request, pytestconfig):
     yield 
 
 def _is_on_github_action():
-    # https://docs.github.com/en/actions/learn-github-actions/variables
-    if "GITHUB_ACTION" in os.environ:
-        return True
-    return False
+    return _ON_GITHUB_ACTION
 
 
 data_dir = os.path.join(os.path.dirname(__file__), "data")
 
 
+# loaded reference pickle files, keyed by path
+_pickle_cache = {}
+
+
+def _load_pickle(filename, reference=False):
+    """Load pickle file, reference files are loaded only once.
+
+    Reference files are cached for their given modification time. Outputs
+    are generated again by each test, they are never cached.
+
+    :param filename: path to the pickle file
+    :param reference: True for reference files
+    :return: unpickled data
+    """
+    if not reference:
+        with open(filename, "rb") as fd:
+            return pickle_data.load(fd, encoding="bytes")
+
+    filename = os.path.abspath(filename)
+    mtime = os.stat(filename).st_mtime_ns
+    cached = _pickle_cache.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(filename, "rb") as fd:
+            cached = _pickle_cache[filename] = (
+                mtime, pickle_data.load(fd, encoding="bytes")
+            )
+
+    return cached[1]
+
+
 class PerformTest:
 
     def __init__(self, runner, reference_dir=None, params=None):
@@ -268,12 +577,30 @@ class PerformTest:
             os.path.splitext(os.path.basename(path))[0] + ".extracted",
         )
 
+    @staticmethod
+    def _array_to_str(value):
+        """Convert array to string, large numeric arrays are summarized.
+
+        :param value: np ndarray
+        :return: string with all the elements or with hash and statistics
+        """
+        if value.size <= 1024 or value.dtype.kind not in 'biuf':
+            return np.array2string(value, threshold=np.inf)
+
+        digest = hashlib.sha1(np.ascontiguousarray(value).tobytes())
+        return (
+            "<ndarray shape={} dtype={} sha1={} min={} max={} mean={}>".format(
+                value.shape, value.dtype, digest.hexdigest()[:16],
+                value.min(), value.max(), value.mean()
+            )
+        )
+
     @staticmethod
     def _data_to_str(data_dict):
         return [
             "{}:{}\n".format(
                 key,
-                np.array2string(value, threshold=np.inf)
+                PerformTest._array_to_str(value)
                 if isinstance(value, np.ndarray)
                 else value,
             )
@@ -287,6 +614,72 @@ class PerformTest:
                 continue
             write_array_diff(v, reference_dict[k], os.path.join(target_dir, k))
 
+    @staticmethod
+    def _dicts_allclose(new_output_dict, reference_dict, rtol):
+        """Compare values of two dicts of strings or numeric arrays.
+
+        Numeric values of the same shape and dtype are stacked and compared
+        at once, each value is compared separately only if the stack
+        differs.
+
+        :param new_output_dict: dict of the new output
+        :param reference_dict: dict of the reference
+        :param rtol: relative tolerance
+        :return: True if all the values are equal or close
+        """
+        buckets = {}
+        for key, value in new_output_dict.items():
+            if isinstance(value[0], str):
+                if value != reference_dict[key]:
+                    return False
+                continue
+            value = np.asarray(value)
+            buckets.setdefault((value.shape, value.dtype), []).append(key)
+
+        for keys in buckets.values():
+            new_values = np.stack([new_output_dict[key] for key in keys])
+            ref_values = [np.asarray(reference_dict[key]) for key in keys]
+            if all(i.shape == new_values.shape[1:] for i in ref_values) \
+               and np.allclose(new_values, np.stack(ref_values), rtol=rtol):
+                continue
+            # different shapes may still be broadcastable
+            for key in keys:
+                if not np.allclose(new_output_dict[key], reference_dict[key],
+                                   rtol=rtol):
+                    return False
+
+        return True
+
+    @staticmethod
+    def _flatten_numeric(data_dict):
+        """Flatten numeric values of the dict into one 1-D float array.
+
+        Numeric scalars and arrays are flattened, lists, dicts, None
+        values and masked arrays are left for the comparison by key.
+
+        :param data_dict: dict to be flattened
+        :return: tuple of the flattened array, list of (key, start,
+            end) offsets of the values in the array and dict of the
+            remaining non-numeric values
+        """
+        values = []
+        offsets = []
+        non_numeric = {}
+        start = 0
+        for key, value in data_dict.items():
+            if isinstance(value, (bool, int, float, np.number)) or \
+               (type(value) is np.ndarray and value.dtype.kind in 'biuf'):
+                value = np.ravel(value)
+                offsets.append((key, start, start + value.size))
+                values.append(value)
+                start += value.size
+            else:
+                non_numeric[key] = value
+
+        flat = np.concatenate(values or [np.empty(0)]).astype(float)
+
+        return flat, offsets, non_numeric
+
     def report_pickle_difference(self, new_output, reference):
         """Report the inconsistency of two files.
 
@@ -299,31 +692,29 @@ class PerformTest:
         diff_fn = new_output + ".diff"
         diff_fd = open(diff_fn, "w")
 
-        with open(new_output, "rb") as left:
-            with open(reference, "rb") as right:
-                new_output_dict = pickle.load(left, encoding="bytes")
-                reference_dict = pickle.load(right, encoding="bytes")
+        new_output_dict = _load_pickle(new_output)
+        reference_dict = _load_pickle(reference, reference=True)
 
-                if not _is_on_github_action():
-                    self._extract_pickle_data(
-                        new_output_dict, self._extract_target_dir(new_output)
-                    )
-                    self._extract_pickle_data(
-                        reference_dict, self._extract_target_dir(reference)
-                    )
-                    self._compare_arrays(
-                        new_output_dict,
-                        reference_dict,
-                        self._extract_target_dir(new_output)
-                    )
+        if not _ON_GITHUB_ACTION:
+            self._extract_pickle_data(
+                new_output_dict, self._extract_target_dir(new_output)
+            )
+            self._extract_pickle_data(
+                reference_dict, self._extract_target_dir(reference)
+            )
+            self._compare_arrays(
+                new_output_dict,
+                reference_dict,
+                self._extract_target_dir(new_output)
+            )
 
-                new_output_str = self._data_to_str(new_output_dict)
-                reference_str = self._data_to_str(reference_dict)
+        new_output_str = self._data_to_str(new_output_dict)
+        reference_str = self._data_to_str(reference_dict)
 
-                # sys.stdout.writelines(
-                #   unified_diff(new_output_str, reference_str)
-                # )
-                diff_fd.writelines(unified_diff(new_output_str, reference_str))
+        # sys.stdout.writelines(
+        #   unified_diff(new_output_str, reference_str)
+        # )
+        diff_fd.writelines(unified_diff(new_output_str, reference_str))
 
         diff_fd.close()
 
@@ -359,41 +750,55 @@ class PerformTest:
 
         relative_tolerance = 0.0001
 
-        with open(dataprep_filepath, "rb") as new_output:
-            with open(reference_filepath, "rb") as reference:
-                new_output_dict = pickle.load(new_output, encoding="bytes")
-                reference_dict = pickle.load(reference, encoding="bytes")
-                for k, v in new_output_dict.items():
-                    if isinstance(v, dict):
-                        for kk, vv in v.items():
-                            if isinstance(vv[0], str):
-                                equal = vv == reference_dict[k][kk]
-                            else:
-                                equal = np.allclose(
-                                    vv, reference_dict[k][kk],
-                                    rtol=relative_tolerance
-                                )
-                            assert equal is True, \
-                                self.report_pickle_difference(
-                                    dataprep_filepath, reference_filepath
-                                )
-                    elif v is None:
-                        assert reference_dict[k] is None, \
-                            self.report_pickle_difference(
-                                dataprep_filepath, reference_filepath
-                            )
-                    else:
-                        if k != 'rc':
-                            equal = np.allclose(
-                                v, reference_dict[k], rtol=relative_tolerance
-                            )
-                        else:
-                            # cannot create an array from inhomogeneous list
-                            equal = v == reference_dict[k]
-                        assert equal, \
-                            self.report_pickle_difference(
-                                dataprep_filepath, reference_filepath
-                            )
+        new_output_dict = _load_pickle(dataprep_filepath)
+        reference_dict = _load_pickle(reference_filepath, reference=True)
+
+        flat_new, offsets, non_numeric = self._flatten_numeric(
+            new_output_dict
+        )
+        flat_ref = np.concatenate(
+            [np.ravel(reference_dict[k]) for k, _, _ in offsets] or
+            [np.empty(0)]
+        ).astype(float)
+        if flat_new.shape != flat_ref.shape or \
+           not np.allclose(flat_new, flat_ref, rtol=relative_tolerance):
+            # locate the first mismatching key
+            for k, _, _ in offsets:
+                assert np.allclose(
+                    new_output_dict[k], reference_dict[k],
+                    rtol=relative_tolerance
+                ), "{}: {}".format(
+                    k, self.report_pickle_difference(
+                        dataprep_filepath, reference_filepath
+                    )
+                )
+
+        for k, v in non_numeric.items():
+            if isinstance(v, dict):
+                equal = self._dicts_allclose(
+                    v, reference_dict[k], relative_tolerance
+                )
+                assert equal is True, \
+                    self.report_pickle_difference(
+                        dataprep_filepath, reference_filepath
+                    )
+            elif v is None:
+                assert reference_dict[k] is None, \
+                    self.report_pickle_difference(
+                        dataprep_filepath, reference_filepath
+                    )
+            else:
+                if k != 'rc':
+                    equal = np.allclose(
+                        v, reference_dict[k], rtol=relative_tolerance
+                    )
+                else:
+                    # cannot create an array from inhomogeneous list
+                    equal = v == reference_dict[k]
+                assert equal, \
+                    self.report_pickle_difference(
+                        dataprep_filepath, reference_filepath
+                    )
 
     def run_roff(self, config_file):
         assert os.path.exists(config_file)
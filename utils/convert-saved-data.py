@@ -4,9 +4,8 @@ import sys
 import os
 import shutil
 import argparse
-import pickle
 
-from smoderp2d.providers.base import BaseProvider
+from smoderp2d.providers.base import BaseProvider, pickle_data
 
 
 def main(filename):
@@ -48,7 +47,7 @@ def load_data(filename):
     :param str filename: file to be loaded
     """
     with open(filename, 'rb') as fd:
-        data = pickle.load(fd, encoding='bytes')
+        data = pickle_data.load(fd, encoding='bytes')
 
     return data
 